@@ -1,9 +1,8 @@
 import streamlit as st
 import json
 import base64
+import hashlib
 from emirates_id_extractor import EmiratesIDExtractor
-import tempfile
-import os
 
 # Set page config
 st.set_page_config(
@@ -54,38 +53,35 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Priority fields for first column
+PRIORITY_FIELDS = {
+    'name': 'Name',
+    'id_number': 'ID Number',
+    'nationality': 'Nationality',
+    'passport_no': 'Passport Number'
+}
+
+# Secondary fields for second column
+SECONDARY_FIELDS = {
+    'profession': 'Profession',
+    'sponsor': 'Sponsor',
+    'place_of_issue': 'Place of Issue',
+    'issue_date': 'Issue Date',
+    'expiry_date': 'Expiry Date'
+}
+
+def fields_html(fields, extracted_info):
+    """Render the extracted fields as a single HTML block."""
+    return "".join(
+        f'<div class="field-label">{label}</div><div class="field-value">{extracted_info[key]}</div>'
+        for key, label in fields.items()
+        if key in extracted_info
+    )
+
 def display_results(col1, col2, extracted_info):
     """Display the extracted information in two columns."""
-    # Priority fields for first column
-    priority_fields = {
-        'name': 'Name',
-        'id_number': 'ID Number',
-        'nationality': 'Nationality',
-        'passport_no': 'Passport Number'
-    }
-    
-    # Secondary fields for second column
-    secondary_fields = {
-        'profession': 'Profession',
-        'sponsor': 'Sponsor',
-        'place_of_issue': 'Place of Issue',
-        'issue_date': 'Issue Date',
-        'expiry_date': 'Expiry Date'
-    }
-    
-    # Display priority fields in first column
-    with col1:
-        for key, label in priority_fields.items():
-            if key in extracted_info:
-                st.markdown(f'<div class="field-label">{label}</div>', unsafe_allow_html=True)
-                st.markdown(f'<div class="field-value">{extracted_info[key]}</div>', unsafe_allow_html=True)
-    
-    # Display secondary fields in second column
-    with col2:
-        for key, label in secondary_fields.items():
-            if key in extracted_info:
-                st.markdown(f'<div class="field-label">{label}</div>', unsafe_allow_html=True)
-                st.markdown(f'<div class="field-value">{extracted_info[key]}</div>', unsafe_allow_html=True)
+    col1.markdown(fields_html(PRIORITY_FIELDS, extracted_info), unsafe_allow_html=True)
+    col2.markdown(fields_html(SECONDARY_FIELDS, extracted_info), unsafe_allow_html=True)
 
 def main():
     st.title("Emirates ID Information Extractor")
@@ -101,7 +97,6 @@ def main():
     AWS_REGION = st.secrets["aws"]["region"]
     AWS_ACCESS_KEY = st.secrets["aws"]["access_key"]
     AWS_SECRET_KEY = st.secrets["aws"]["secret_key"]
-    OPENAI_API_KEY = st.secrets["openai"]["api_key"]
     BUCKET_NAME = st.secrets["aws"]["bucket_name"]
 
     @st.cache_resource
@@ -109,12 +104,17 @@ def main():
         return EmiratesIDExtractor(
             region_name=AWS_REGION,
             aws_access_key_id=AWS_ACCESS_KEY,
-            aws_secret_access_key=AWS_SECRET_KEY,
-            openai_api_key=OPENAI_API_KEY
+            aws_secret_access_key=AWS_SECRET_KEY
         )
 
     extractor = get_extractor()
 
+    # Keyed on the content hash so re-processing an identical upload skips
+    # OCR and extraction entirely
+    @st.cache_data(max_entries=256, show_spinner=False)
+    def extract_info(file_hash, filename, _file_content):
+        return extractor.extract_text_from_image(_file_content, filename, BUCKET_NAME)
+
     if 'current_file_name' not in st.session_state:
         st.session_state.current_file_name = None
 
@@ -130,18 +130,17 @@ def main():
                 del st.session_state.file_content
         
         if 'file_content' not in st.session_state:
-            st.session_state.file_content = uploaded_file.read()
+            st.session_state.file_content = uploaded_file.getvalue()
 
         if st.button("Process the Card", type="primary"):
             with st.spinner("Processing Emirates ID..."):
                 try:
-                    file_extension = os.path.splitext(uploaded_file.name)[1]
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp_file:
-                        tmp_file.write(st.session_state.file_content)
-                        temp_path = tmp_file.name
-
-                    extracted_info = extractor.extract_text_from_image(temp_path, BUCKET_NAME)
-                    os.unlink(temp_path)
+                    file_content = st.session_state.file_content
+                    extracted_info = extract_info(
+                        hashlib.sha256(file_content).hexdigest(),
+                        uploaded_file.name,
+                        file_content
+                    )
 
                     st.session_state.extracted_info = extracted_info
 
@@ -1,88 +1,217 @@
 import boto3
-import json
+from botocore.config import Config
+import functools
+import importlib.util
+import logging
 from typing import Dict, Optional
 import os
 import re
-from datetime import datetime
-from langchain.llms import OpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.chains.question_answering import load_qa_chain
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 
-class EmiratesIDExtractor:
-    def __init__(self, region_name: str, aws_access_key_id: str, aws_secret_access_key: str, openai_api_key: str):
-        """Initialize the Emirates ID Extractor with AWS and OpenAI credentials."""
-        self.textract_client = boto3.client(
-            "textract",
-            region_name=region_name,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key
-        )
+logger = logging.getLogger(__name__)
+
+# Label and value pattern for each field. The fields are combined into one
+# alternation so the OCR text is scanned once; every field is anchored to a
+# line start so a missing label fails fast instead of backtracking. A value is
+# the longest run of its allowed characters, so trailing OCR noise truncates
+# it rather than dropping the field
+_PATTERNS = {
+    'name': (r'Name', r"[A-Z][A-Z \t'.,-]*"),
+    'id_number': (r'ID Number|U\.I\.D\.No', r'[A-Z0-9][A-Z0-9 \t/-]*'),
+    'nationality': (r'Nationality', r"[A-Z][A-Z \t'.,-]*"),
+    'passport_no': (r'Passport[ \t]*(?:No|Number)', r'[A-Z0-9]+'),
+    'profession': (r'Profession', r"[A-Z(][A-Z \t()'.,/&-]*"),
+    'sponsor': (r'Sponsor', r"[A-Z][A-Z \t()'.,/&-]*"),
+    'place_of_issue': (r'Place[ \t]*of[ \t]*Issue', r"[A-Z][A-Z \t'.,-]*"),
+    'issue_date': (r'Issue[ \t]*Date', r'\d{4}/\d{2}/\d{2}'),
+    'expiry_date': (r'Expiry[ \t]*Date', r'\d{4}/\d{2}/\d{2}')
+}
+
+# A value may sit on the line after its label, but never starts with another
+# field's label; otherwise an empty label would swallow the next field's line
+_LABELS = '|'.join(label for label, _ in _PATTERNS.values())
+
+_COMBINED_RE = re.compile(
+    '|'.join(
+        rf'(?P<{field}>^[ \t]*(?:{label})[ \t]*(?::|\s)\s*(?!(?:{_LABELS})\b)(?P<{field}_val>{value}))'
+        for field, (label, value) in _PATTERNS.items()
+    ),
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Local OCR is only trusted when every word on a line reaches this confidence,
+# every field was found and the ID number has the Emirates ID layout
+_MIN_OCR_CONFIDENCE = 80
+_ID_NUMBER_RE = re.compile(r'784-\d{4}-\d{7}-\d')
+
+# Shared by the Textract and S3 clients so their keep-alive pools outlive a
+# single request
+_BOTO_CONFIG = Config(max_pool_connections=20, retries={'max_attempts': 2})
+
+# Staged S3 objects are deleted off the request path
+_BG = ThreadPoolExecutor(max_workers=2)
+
+# Textract's synchronous API accepts documents up to 5 MB inline; anything
+# larger has to be read from S3
+_MAX_INLINE_BYTES = 5 * 1024 * 1024
+
+_EMIRATES = frozenset({
+    'dubai', 'abu dhabi', 'sharjah', 'ajman', 'umm al quwain', 'ras al khaimah', 'fujairah'
+})
+
+def _log_failed_delete(bucket_name: str, s3_file_path: str, future) -> None:
+    """Report a background S3 delete that failed, so the staged card isn't left unnoticed."""
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Failed to delete s3://%s/%s: %s", bucket_name, s3_file_path, exc)
+
+def _is_english_only(line: str) -> bool:
+    """Check in a single pass that a line contains English text and no Arabic."""
+    has_latin = False
+    for ch in line:
+        if '\u0600' <= ch <= '\u06ff':
+            return False
+        if not has_latin and ('A' <= ch <= 'Z' or 'a' <= ch <= 'z'):
+            has_latin = True
+    return has_latin
+
+def _regex_extract(text: str) -> Dict[str, str]:
+    """Extract labelled fields from the English-only OCR text with the precompiled patterns.
+
+    A label with no value doesn't consume the next field's line:
+
+    >>> _regex_extract("Name:\\nID Number: 784-1990-1234567-1\\nNationality: India")
+    {'id_number': '784-1990-1234567-1', 'nationality': 'India'}
+    >>> _regex_extract("Sponsor:\\nPlace of Issue: Dubai")
+    {'place_of_issue': 'Dubai'}
+    """
+    extracted_info = {}
+
+    # Extract every labelled field in a single pass, keeping the first match
+    for match in _COMBINED_RE.finditer(text):
+        field = match.lastgroup
+        if field in extracted_info:
+            continue
+        value = match.group(f'{field}_val').strip()
+        if value and value.lower() != 'not found':
+            extracted_info[field] = value
+
+    # Fall back to an unlabelled emirate name on a line of its own
+    if 'place_of_issue' not in extracted_info:
+        for line in text.split('\n'):
+            city = line.strip().lower()
+            if city in _EMIRATES:
+                extracted_info['place_of_issue'] = city.title()
+                break
+
+    return extracted_info
+
+@functools.lru_cache(maxsize=1)
+def _tesseract_available() -> bool:
+    """Check once whether pytesseract, Pillow and the tesseract binary are installed."""
+    if importlib.util.find_spec('PIL') is None:
+        return False
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except (ImportError, OSError):
+        return False
+    return True
+
+class LocalOCR:
+    """Run Tesseract locally so common cards need no AWS round-trip."""
 
-        self.s3_client = boto3.client(
-            "s3",
+    def __init__(self, lang: str = 'eng', min_confidence: float = _MIN_OCR_CONFIDENCE):
+        # The English model reads Arabic glyphs as low-confidence Latin junk, so
+        # lines containing any such word are dropped rather than trusted
+        self.lang = lang
+        self.min_confidence = min_confidence
+
+    def extract_text(self, image_bytes: bytes) -> Optional[str]:
+        """Return the confidently read OCR lines, or None if local OCR is unavailable or can't read the file."""
+        if not _tesseract_available():
+            return None
+
+        import pytesseract
+        from PIL import Image
+
+        try:
+            with Image.open(BytesIO(image_bytes)) as image:
+                data = pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
+        except (OSError, pytesseract.TesseractError):
+            # Unsupported format such as PDF
+            return None
+
+        lines = {}
+        unsure = set()
+        for i, word in enumerate(data['text']):
+            if not word.strip():
+                continue
+            line = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(line, []).append(word)
+            if float(data['conf'][i]) < self.min_confidence:
+                unsure.add(line)
+
+        return "\n".join(" ".join(words) for line, words in lines.items() if line not in unsure)
+
+class EmiratesIDExtractor:
+    def __init__(self, region_name: str, aws_access_key_id: str, aws_secret_access_key: str):
+        """Initialize the Emirates ID Extractor with AWS credentials."""
+        self._session = boto3.Session(
             region_name=region_name,
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key
         )
+        self.textract_client = self._session.client("textract", config=_BOTO_CONFIG)
+        self.s3_client = self._session.client("s3", config=_BOTO_CONFIG)
 
-        os.environ["OPENAI_API_KEY"] = openai_api_key
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=512,
-            chunk_overlap=32,
-            length_function=len,
-        )
-        self.embeddings = OpenAIEmbeddings()
-        self.llm = OpenAI(temperature=0)
+        self.local_ocr = LocalOCR()
 
     def process_and_query(self, text: str) -> Dict[str, str]:
-        """Process extracted text using LangChain and OpenAI."""
+        """Extract the labelled fields from the English-only OCR text."""
         try:
-            # Updated regex patterns to better match the exact format
-            patterns = {
-                'name': r'Name\s*(?:[:\n]|\s{2,})\s*([A-Z\s]+(?=[^a-z]|$))',
-                'id_number': r'(?:ID Number|U\.I\.D\.No)\s*(?:[:\n]|\s{2,})\s*([A-Z0-9\s/-]+)(?=[^a-z0-9]|$)',
-                'nationality': r'Nationality\s*(?:[:\n]|\s{2,})\s*([A-Z\s]+(?=[^a-z]|$))',
-                'passport_no': r'Passport\s*(?:No|Number)\s*(?:[:\n]|\s{2,})\s*([A-Z0-9]+)(?=[^a-z0-9]|$)',
-                'profession': r'Profession\s*(?:[:\n]|\s{2,})\s*([A-Za-z\s()]+)(?=[^a-z]|$)',
-                'sponsor': r'Sponsor\s*(?:[:\n]|\s{2,})\s*([A-Z\s&.]+(?=[^a-z]|$))',
-                'place_of_issue': r'Place\s*(?:Of|of)\s*Issue\s*(?:[:\n]|\s{2,})\s*([A-Za-z\s]+)(?=[^a-z]|$)',
-                'issue_date': r'Issue\s*Date\s*(?:[:\n]|\s{2,})\s*(\d{4}/\d{2}/\d{2})',
-                'expiry_date': r'Expiry\s*Date\s*(?:[:\n]|\s{2,})\s*(\d{4}/\d{2}/\d{2})'
-            }
-
-            extracted_info = {}
-            
-            # Process only lines that contain English text
-            english_lines = []
-            for line in text.split('\n'):
-                # Check if line contains English text and no Arabic
-                if re.search(r'[A-Za-z]', line) and not re.search(r'[\u0600-\u06FF]', line):
-                    english_lines.append(line)
-            
-            english_text = '\n'.join(english_lines)
-
-            # Extract information using patterns
-            for field, pattern in patterns.items():
-                match = re.search(pattern, english_text, re.IGNORECASE)
-                if match:
-                    value = match.group(1).strip()
-                    if value and value.lower() != 'not found':
-                        extracted_info[field] = value
-
-            return extracted_info
+            return _regex_extract(text)
 
         except Exception as e:
             raise Exception(f"Error in text processing: {str(e)}")
 
-    def extract_text_from_image(self, image_path: str, bucket_name: str) -> Dict[str, str]:
-        """Extract text from Emirates ID image using Amazon Textract and process with LLM."""
+    def extract_text_from_image(self, image_bytes: bytes, filename: str, bucket_name: str) -> Dict[str, str]:
+        """Extract the card fields, trying local OCR before falling back to Amazon Textract."""
         try:
-            s3_file_path = f"emirates_ids/{os.path.basename(image_path)}"
-            s3_uri = self.upload_to_s3(image_path, bucket_name, s3_file_path)
+            # Local OCR first; Textract unless it confidently found every field
+            local_text = self.local_ocr.extract_text(image_bytes)
+            if local_text:
+                extracted_info = _regex_extract(local_text)
+                if (_PATTERNS.keys() <= extracted_info.keys()
+                        and _ID_NUMBER_RE.fullmatch(extracted_info['id_number'])):
+                    return extracted_info
+
+            if len(image_bytes) <= _MAX_INLINE_BYTES:
+                response = self.textract_client.detect_document_text(
+                    Document={'Bytes': image_bytes}
+                )
+            else:
+                response = self.detect_text_via_s3(image_bytes, filename, bucket_name)
+
+            # Extract text, keeping only LINE blocks with English and no Arabic
+            is_english_only = _is_english_only
+            extracted_text = "\n".join(
+                block['Text'] for block in response['Blocks']
+                if block['BlockType'] == 'LINE' and is_english_only(block['Text'])
+            )
+            return self.process_and_query(extracted_text)
+
+        except Exception as e:
+            raise Exception(f"Error processing Emirates ID: {str(e)}")
 
-            response = self.textract_client.detect_document_text(
+    def detect_text_via_s3(self, image_bytes: bytes, filename: str, bucket_name: str) -> Dict:
+        """Run Textract on an image too large to send inline by staging it in S3."""
+        s3_file_path = f"emirates_ids/{uuid.uuid4().hex}_{os.path.basename(filename)}"
+        self.upload_to_s3(image_bytes, bucket_name, s3_file_path)
+        try:
+            return self.textract_client.detect_document_text(
                 Document={
                     'S3Object': {
                         'Bucket': bucket_name,
@@ -90,29 +219,14 @@ class EmiratesIDExtractor:
                     }
                 }
             )
+        finally:
+            future = _BG.submit(self.s3_client.delete_object, Bucket=bucket_name, Key=s3_file_path)
+            future.add_done_callback(functools.partial(_log_failed_delete, bucket_name, s3_file_path))
 
-            # Extract text, focusing on English lines
-            extracted_lines = []
-            for block in response['Blocks']:
-                if block['BlockType'] == 'LINE':
-                    text = block['Text']
-                    # Only include if contains English and no Arabic
-                    if re.search(r'[A-Za-z]', text) and not re.search(r'[\u0600-\u06FF]', text):
-                        extracted_lines.append(text)
-
-            extracted_text = "\n".join(extracted_lines)
-            extracted_info = self.process_and_query(extracted_text)
-
-            self.s3_client.delete_object(Bucket=bucket_name, Key=s3_file_path)
-            return extracted_info
-
-        except Exception as e:
-            raise Exception(f"Error processing Emirates ID: {str(e)}")
-
-    def upload_to_s3(self, local_file_path: str, bucket_name: str, s3_file_path: str) -> str:
-        """Upload the image to S3 bucket."""
+    def upload_to_s3(self, image_bytes: bytes, bucket_name: str, s3_file_path: str) -> str:
+        """Upload the in-memory image to S3 bucket."""
         try:
-            self.s3_client.upload_file(local_file_path, bucket_name, s3_file_path)
+            self.s3_client.upload_fileobj(BytesIO(image_bytes), bucket_name, s3_file_path)
             return f"s3://{bucket_name}/{s3_file_path}"
         except Exception as e:
             raise Exception(f"Error uploading to S3: {str(e)}")
\ No newline at end of file